@@ -8,40 +8,109 @@ import re
 import json
 import sys
 import argparse
+import bisect
+import hashlib
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
+import mmap
 import os
 
-@dataclass
+# orjson (C/SIMD) wenn verfügbar — im RagFlow-Container immer installiert,
+# das Skript bleibt aber auch ohne lauffähig
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Vorkompilierte Regex-Pattern (einmal pro Import statt einmal pro Aufruf)
+TS_RE = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3})')
+TS_PREFIX_RE = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+CONV_RE = re.compile(r'konversation\s+(\d+)')
+# Zweistufige Dokument-Extraktion: billiger Header-Match mit Literal-Prefix,
+# der Content wird zwischen den Headern geschnitten statt per .*?-Lookahead
+DOC_HEADER_RE = re.compile(r'ID:\s*(\d+)\s*├──\s*Title:\s*([^\n]+)\s*└──\s*Content:')
+DOC_TERM_RE = re.compile(r'\n\s*------|\n\s*\}\s*,|\n\s*\]\s*\}')
+TAIL_RE = re.compile(r'\s*\}\s*,?\s*\]\s*\}?\s*$')
+
+# Ein Decoder für alle Blöcke; raw_decode findet das Array-Ende im C-Code
+_JSON = json.JSONDecoder()
+
+def _sequence_fingerprint(user_messages: List[str]) -> bytes:
+    """Kompakter blake2b-Fingerprint einer User-Nachrichten-Sequenz"""
+    return hashlib.blake2b('\x00'.join(user_messages).encode('utf-8', 'surrogatepass'),
+                           digest_size=16).digest()
+
+@dataclass(slots=True)
 class Message:
     timestamp: datetime
     user_message: str
     claude_response: str
     context_documents: List[Dict[str, str]]
 
-@dataclass
+@dataclass(slots=True)
 class Conversation:
     chat_id: str
     first_message: str
     start_time: datetime
     message_count: int
     messages: List[Message]
+    # Gecacht, damit Zeit-Abfragen nicht über alle Messages laufen müssen
+    last_timestamp: Optional[datetime] = None
 
 class RagFlowLogAnalyzer:
     def __init__(self, logfile_path: str):
         self.logfile_path = logfile_path
         self.conversations: Dict[str, Conversation] = {}
+        # Inkrementelle Buchführung: sortierte IDs + letzter Timestamp je
+        # Konversation, damit Prefix-Abfragen nicht alle Messages scannen
+        self._conv_ids_sorted: List[str] = []
+        self._last_ts_by_conv: Dict[str, datetime] = {}
+        # Aufsteigend sortierte, bereits geparste HISTORY-Blöcke aus
+        # analyze_logfile für spätere Antwort-Suchen ohne erneutes Einlesen
+        self._history_blocks_by_time: List[Dict] = []
+        self._history_block_times: List[datetime] = []
+        # Einmal geparst = für alle Ansichten wiederverwendet
+        self._analyzed = False
+
+    def ensure_parsed(self) -> Dict[str, Conversation]:
+        """Parst das Logfile beim ersten Aufruf und cached das Ergebnis"""
+        if not self._analyzed:
+            self.analyze_logfile()
+            self._analyzed = True
+        return self.conversations
+
+    def _register_conversation(self, conv_id: str, conversation: Conversation) -> None:
+        """Registriert eine Konversation inklusive Buchführung für Zeit-Abfragen"""
+        if conv_id not in self.conversations:
+            bisect.insort(self._conv_ids_sorted, conv_id)
+        self.conversations[conv_id] = conversation
+        if conversation.last_timestamp is None and conversation.messages:
+            conversation.last_timestamp = max(msg.timestamp for msg in conversation.messages)
+        if conversation.last_timestamp is not None:
+            self._last_ts_by_conv[conv_id] = conversation.last_timestamp
+
+    def _iter_conv_ids_with_prefix(self, base_chat_id: str):
+        """Liefert alle Konversations-IDs mit gegebenem Prefix (bisect statt Vollscan)"""
+        i = bisect.bisect_left(self._conv_ids_sorted, base_chat_id)
+        while i < len(self._conv_ids_sorted):
+            conv_id = self._conv_ids_sorted[i]
+            if not conv_id.startswith(base_chat_id):
+                break
+            yield conv_id
+            i += 1
         
-    def parse_timestamp(self, timestamp_str: str) -> datetime:
+    @staticmethod
+    def parse_timestamp(timestamp_str: str) -> datetime:
         """Parst einen Timestamp aus dem Logfile"""
+        # Das Format ist fix (YYYY-MM-DD HH:MM:SS,mmm), direktes Slicing ist
+        # um ein Vielfaches schneller als datetime.strptime
         try:
-            return datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S,%f")
-        except ValueError:
-            try:
-                return datetime.strptime(timestamp_str[:19], "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                return datetime.now()
+            return datetime(int(timestamp_str[0:4]), int(timestamp_str[5:7]), int(timestamp_str[8:10]),
+                            int(timestamp_str[11:13]), int(timestamp_str[14:16]), int(timestamp_str[17:19]),
+                            int(timestamp_str[20:23]) * 1000 if len(timestamp_str) >= 23 else 0)
+        except (ValueError, IndexError):
+            return datetime.now()
     
     def extract_context_documents(self, log_content: str) -> List[Dict[str, str]]:
         """Extrahiert Kontext-Dokumente aus einem Log-Eintrag"""
@@ -51,32 +120,71 @@ class RagFlowLogAnalyzer:
         if '\\n' in log_content:
             log_content = log_content.replace('\\n', '\n')
 
-        # Suche nach dem Coverdale-Wissen Pattern
-        pattern = r'ID:\s*(\d+)\s*├──\s*Title:\s*([^\n]+)\s*└──\s*Content:\s*(.*?)(?=\n\s*------|\nID:|\n\s*\}\s*,|\n\s*\]\s*\}|\Z)'
-        matches = re.findall(pattern, log_content, re.DOTALL)
-        
-        for match in matches:
-            doc_id, title, content = match
+        # Suche nach dem Coverdale-Wissen Pattern: erst alle Header finden,
+        # dann den Content zwischen aufeinanderfolgenden Headern schneiden
+        headers = list(DOC_HEADER_RE.finditer(log_content))
+
+        for idx, header in enumerate(headers):
+            start = header.end()
+            end = headers[idx + 1].start() if idx + 1 < len(headers) else len(log_content)
+            content = log_content[start:end]
+
+            # Content endet am ersten Block-Terminator innerhalb des Ausschnitts
+            term = DOC_TERM_RE.search(content)
+            if term:
+                content = content[:term.start()]
+
             content_clean = content.strip()
-            content_clean = re.sub(r'\s*\}\s*,?\s*\]\s*\}?\s*$', '', content_clean)
-            
+            content_clean = TAIL_RE.sub('', content_clean)
+
             documents.append({
-                'id': doc_id.strip(),
-                'title': title.strip(),
+                'id': header.group(1).strip(),
+                'title': header.group(2).strip(),
                 'content': content_clean
             })
         
         return documents
 
+    def _extract_history_json(self, block_content: str) -> Optional[List[Dict]]:
+        """Extrahiert und parst das JSON-Array eines HISTORY-Blocks"""
+        history_marker = block_content.find('[HISTORY][')
+        if history_marker == -1:
+            return None
+
+        json_part = block_content[history_marker + len('[HISTORY]['):].strip()
+
+        # Robuste JSON-Extraktion (wie vorher)
+        if not json_part.startswith('['):
+            if json_part.startswith('{'):
+                json_part = '[' + json_part
+            else:
+                return None
+
+        # Schneller Pfad: orjson parst den kompletten Ausschnitt in C
+        if orjson is not None:
+            try:
+                return orjson.loads(json_part)
+            except orjson.JSONDecodeError:
+                pass  # z. B. Log-Text hinter dem Array → raw_decode unten
+
+        # raw_decode parst das Array und ignoriert nachfolgenden Log-Text,
+        # ohne den Python-weisen Klammer-Scan Zeichen für Zeichen
+        try:
+            history_data, _ = _JSON.raw_decode(json_part)
+            return history_data
+        except (json.JSONDecodeError, ValueError):
+            return None
+
     def determine_conversation_id(self, base_chat_id: str, user_message: str, timestamp: datetime, history_data: List[Dict]) -> str:
         """Bestimmt eine eindeutige Konversations-ID basierend auf verschiedenen Heuristiken"""
 
         # Heuristik 1: Prüfe explizite Konversationsnummern
-        pattern = r'konversation\s+(\d+)'
-        match = re.search(pattern, user_message.lower())
-        if match:
-            conv_num = match.group(1)
-            return f"{base_chat_id}_conv{conv_num}"
+        user_message_lower = user_message.lower()
+        if 'konversation' in user_message_lower:
+            match = CONV_RE.search(user_message_lower)
+            if match:
+                conv_num = match.group(1)
+                return f"{base_chat_id}_conv{conv_num}"
 
         # Heuristik 2: Prüfe HISTORY-Reset (nur System + User = neue Konversation)
         user_messages = [msg for msg in history_data if msg.get('role') == 'user']
@@ -103,13 +211,12 @@ class RagFlowLogAnalyzer:
         if not self.conversations:
             return True
 
-        # Finde die neueste Message für diese Chat-ID
+        # Finde die neueste Message für diese Chat-ID über die Buchführung
         latest_timestamp = None
-        for conv_id, conv in self.conversations.items():
-            if conv_id.startswith(base_chat_id) and conv.messages:
-                conv_latest = max(msg.timestamp for msg in conv.messages)
-                if latest_timestamp is None or conv_latest > latest_timestamp:
-                    latest_timestamp = conv_latest
+        for conv_id in self._iter_conv_ids_with_prefix(base_chat_id):
+            conv_latest = self._last_ts_by_conv.get(conv_id)
+            if conv_latest is not None and (latest_timestamp is None or conv_latest > latest_timestamp):
+                latest_timestamp = conv_latest
 
         if latest_timestamp is None:
             return True
@@ -125,103 +232,32 @@ class RagFlowLogAnalyzer:
 
     def _get_current_conversation_id(self, base_chat_id: str) -> str:
         """Findet die aktuellste Konversations-ID für eine Chat-ID oder erstellt eine neue"""
-        # Finde alle Konversationen für diese Chat-ID
-        matching_convs = [(conv_id, conv) for conv_id, conv in self.conversations.items()
-                         if conv_id.startswith(base_chat_id)]
+        # Finde die neueste Konversation für diese Chat-ID über die Buchführung
+        latest_conv_id = None
+        latest_timestamp = None
+        for conv_id in self._iter_conv_ids_with_prefix(base_chat_id):
+            conv_latest = self._last_ts_by_conv.get(conv_id)
+            if conv_latest is not None and (latest_timestamp is None or conv_latest > latest_timestamp):
+                latest_timestamp = conv_latest
+                latest_conv_id = conv_id
 
-        if not matching_convs:
+        if latest_conv_id is None:
             return base_chat_id
 
-        # Finde die neueste Konversation
-        latest_conv = max(matching_convs, key=lambda x: max(msg.timestamp for msg in x[1].messages))
-        return latest_conv[0]
+        return latest_conv_id
 
     def _find_claude_response_after_post(self, post_timestamp: datetime, user_message: str) -> str:
         """Findet die Claude-Antwort im nächsten HISTORY-Block nach dem POST-Request"""
 
-        # Lade das Logfile neu und suche nach HISTORY-Blöcken nach dem POST-Timestamp
-        with open(self.logfile_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-
-        lines = content.split('\n')
-
-        for i, line in enumerate(lines):
-            if '[HISTORY][' in line:
-                # Extrahiere Timestamp
-                timestamp_match = re.match(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3})', line)
-                if timestamp_match:
-                    timestamp_str = timestamp_match.group(1)
-                    history_timestamp = self.parse_timestamp(timestamp_str)
-
-                    # Nur HISTORY-Blöcke nach dem POST-Request betrachten
-                    if history_timestamp > post_timestamp:
-                        # Sammle JSON-Inhalt des HISTORY-Blocks
-                        json_lines = [line]
-                        j = i + 1
-
-                        while j < len(lines):
-                            next_line = lines[j]
-                            if re.match(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', next_line):
-                                break
-                            json_lines.append(next_line)
-                            j += 1
-
-                        # Parse JSON und suche nach Assistant-Antwort
-                        try:
-                            json_content = '\n'.join(json_lines)
-                            # Finde JSON-Start nach [HISTORY][
-                            history_marker = json_content.find('[HISTORY][')
-                            if history_marker != -1:
-                                json_start = history_marker + len('[HISTORY][')
-                                json_part = json_content[json_start:]
-
-                                # Robuste JSON-Extraktion wie in analyze_logfile
-                                json_part = json_part.strip()
-                                if not json_part.startswith('['):
-                                    if json_part.startswith('{'):
-                                        json_part = '[' + json_part
-                                    else:
-                                        continue
-
-                                bracket_count = 0
-                                in_string = False
-                                escape_next = False
-                                json_end = len(json_part)
-
-                                for k, char in enumerate(json_part):
-                                    if escape_next:
-                                        escape_next = False
-                                        continue
-                                    if char == '\\' and in_string:
-                                        escape_next = True
-                                        continue
-                                    if char == '"' and not escape_next:
-                                        in_string = not in_string
-                                    if not in_string:
-                                        if char == '[':
-                                            bracket_count += 1
-                                        elif char == ']':
-                                            bracket_count -= 1
-                                            if bracket_count == 0:
-                                                json_end = k + 1
-                                                break
-
-                                json_str = json_part[:json_end]
-                                history_data = json.loads(json_str)
-
-                                # Suche nach der User-Nachricht und der darauffolgenden Assistant-Antwort
-                                for idx, msg in enumerate(history_data):
-                                    if (msg.get('role') == 'user' and
-                                        msg.get('content', '').strip() == user_message.strip()):
-                                        # Finde die nächste Assistant-Nachricht
-                                        for next_idx in range(idx + 1, len(history_data)):
-                                            if history_data[next_idx].get('role') == 'assistant':
-                                                assistant_content = history_data[next_idx].get('content', '').strip()
-                                                if assistant_content:
-                                                    return assistant_content
-
-                        except (json.JSONDecodeError, ValueError):
-                            continue
+        # Nutzt die bereits von analyze_logfile geparsten Blöcke statt das
+        # Logfile erneut zu lesen; bisect springt zum ersten Block nach dem POST
+        i = bisect.bisect_right(self._history_block_times, post_timestamp)
+        user_msg = user_message.strip()
+
+        for block in self._history_blocks_by_time[i:]:
+            response = block['user_to_assistant'].get(user_msg)
+            if response:
+                return response
 
         return None
 
@@ -229,247 +265,195 @@ class RagFlowLogAnalyzer:
         """Analysiert das komplette Logfile mit neuem Ansatz: vom Ende her arbeiten"""
         print("Analysiere Logfile...")
 
-        with open(self.logfile_path, 'r', encoding='utf-8') as file:
-            content = file.read()
+        # mmap statt read(): demand-paged, keine Vollkopie des Logs im Heap
+        if os.path.getsize(self.logfile_path) == 0:
+            print("Logfile ist leer.")
+            return
+
+        with open(self.logfile_path, 'rb') as file:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
 
-        lines = content.split('\n')
-        print(f"Logfile hat {len(lines)} Zeilen")
+        size = len(mm)
+        print(f"Logfile hat {size} Bytes")
 
-        # Sammle alle HISTORY-Blöcke
+        # Sammle alle HISTORY-Blöcke; mm.find (memchr) springt direkt zum
+        # nächsten Block statt jede Zeile einzeln anzufassen
         history_blocks = []
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-
-            if '[HISTORY][' in line:
-                # Extrahiere Timestamp
-                timestamp_match = re.match(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3})', line)
-                if timestamp_match:
-                    timestamp_str = timestamp_match.group(1)
-                    timestamp = self.parse_timestamp(timestamp_str)
-
-                    # Sammle den kompletten Block
-                    block_lines = [line]
-                    j = i + 1
-
-                    while j < len(lines):
-                        next_line = lines[j]
-                        if re.match(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', next_line):
-                            break
-                        block_lines.append(next_line)
-                        j += 1
-
-                    block_content = '\n'.join(block_lines)
-
-                    history_blocks.append({
-                        'timestamp': timestamp,
-                        'timestamp_str': timestamp_str,
-                        'content': block_content,
-                        'line_number': i
-                    })
-
-                    i = j
-                else:
-                    i += 1
-            else:
-                i += 1
+        pos = 0
+        while True:
+            hit = mm.find(b'[HISTORY][', pos)
+            if hit == -1:
+                break
+
+            # Zeilenanfang des Treffers bestimmen und Timestamp extrahieren
+            line_start = mm.rfind(b'\n', 0, hit) + 1
+            header = mm[line_start:line_start + 23].decode('utf-8', errors='replace')
+            timestamp_match = TS_RE.match(header)
+            if not timestamp_match:
+                pos = hit + len(b'[HISTORY][')
+                continue
+
+            timestamp_str = timestamp_match.group(1)
+            timestamp = self.parse_timestamp(timestamp_str)
+
+            # Blockende: nächste Zeile, die mit einem Timestamp beginnt
+            end = hit
+            pos = size
+            while True:
+                nl = mm.find(b'\n', end)
+                if nl == -1 or nl + 1 >= size:
+                    end = size
+                    break
+                cand_start = nl + 1
+                cand = mm[cand_start:cand_start + 23]
+                # Billiger Zeichen-Vorfilter, Regex nur für Kandidaten
+                if (len(cand) >= 11 and cand[4:5] == b'-' and cand[7:8] == b'-'
+                        and cand[10:11] == b' '
+                        and TS_PREFIX_RE.match(cand.decode('utf-8', errors='replace'))):
+                    end = nl
+                    pos = cand_start
+                    break
+                end = cand_start
+
+            # Nur der Block-Ausschnitt wird dekodiert, nie das ganze Logfile
+            block_content = mm[line_start:end].decode('utf-8', errors='replace')
+
+            # JSON direkt beim Einsammeln parsen (ein Durchlauf statt zwei)
+            history_data = self._extract_history_json(block_content)
+            user_messages = []
+            user_to_assistant = {}
+            if history_data is not None:
+                last_user = None
+                for msg in history_data:
+                    role = msg.get('role')
+                    # Nur einmal strippen und nur für relevante Rollen
+                    if role == 'user':
+                        content = msg.get('content', '').strip()
+                        user_messages.append(content)
+                        last_user = content
+                    elif role == 'assistant' and last_user is not None and last_user not in user_to_assistant:
+                        user_to_assistant[last_user] = msg.get('content', '').strip()
+                        last_user = None
+
+            history_blocks.append({
+                'timestamp': timestamp,
+                'timestamp_str': timestamp_str,
+                'content': block_content,
+                'line_number': line_start,
+                'history_data': history_data,
+                'user_messages': user_messages,
+                'user_to_assistant': user_to_assistant,
+                'context_docs': None
+            })
 
+        mm.close()
         print(f"Gefundene HISTORY-Blöcke: {len(history_blocks)}")
 
         # Sortiere HISTORY-Blöcke rückwärts chronologisch (neueste zuerst)
         history_blocks.sort(key=lambda x: x['timestamp'], reverse=True)
 
+        # Indiziere die bereits geparsten Blöcke für die Kontext-Suche nach
+        # (Anzahl User-Nachrichten, letzte User-Nachricht)
+        blocks_by_count: Dict[Tuple[int, str], List[Dict]] = {}
+        for hist_block in history_blocks:
+            user_messages = hist_block['user_messages']
+            if user_messages:
+                blocks_by_count.setdefault((len(user_messages), user_messages[-1]), []).append(hist_block)
+
+        # Speicher-Deckel: Roh-Content wird nur für Blöcke behalten, die als
+        # Kontext-Quelle dienen können (erster Kandidat je Index-Eintrag);
+        # alle übrigen Block-Texte werden sofort freigegeben
+        context_sources = {id(candidates[0]) for candidates in blocks_by_count.values()}
+        for hist_block in history_blocks:
+            if id(hist_block) not in context_sources:
+                hist_block['content'] = None
+
+        # Aufsteigend sortierte Sicht für _find_claude_response_after_post
+        self._history_blocks_by_time = history_blocks[::-1]
+        self._history_block_times = [b['timestamp'] for b in self._history_blocks_by_time]
+
         # Sammle alle gefundenen Konversationen (als Set von User-Nachrichten-Sequenzen)
         found_conversations = []
+        # Fingerprints aller Prefixe bereits gefundener Konversationen: der
+        # Teilmengen-Test wird ein einzelner Set-Lookup auf (Länge, Digest)
+        seen_prefixes = set()
 
         for hist_block in history_blocks:
             timestamp = hist_block['timestamp']
             timestamp_str = hist_block['timestamp_str']
-            block_content = hist_block['content']
+            history_data = hist_block['history_data']
+            user_messages = hist_block['user_messages']
 
-            # Parse JSON aus dem HISTORY-Block
-            try:
-                # Finde JSON-Start nach [HISTORY][ wie in der ursprünglichen Implementierung
-                history_marker = block_content.find('[HISTORY][')
-                if history_marker == -1:
-                    continue
-
-                json_start = history_marker + len('[HISTORY][')
-                json_part = block_content[json_start:]
-
-                # Robuste JSON-Extraktion (wie vorher)
-                json_part = json_part.strip()
-                if not json_part.startswith('['):
-                    if json_part.startswith('{'):
-                        json_part = '[' + json_part
+            if not user_messages:
+                continue
+
+            # Prüfe ob diese Sequenz bereits Teil einer gefundenen Konversation ist
+            is_subset = (len(user_messages), _sequence_fingerprint(user_messages)) in seen_prefixes
+
+            if not is_subset:
+                # Neue Konversation gefunden!
+                conversation_id = f"conv_{len(found_conversations) + 1}_{timestamp.strftime('%Y%m%d_%H%M%S')}"
+
+                # Erstelle Messages für alle User-Nachrichten
+                messages = []
+
+                user_to_assistant = hist_block['user_to_assistant']
+                for i, user_msg in enumerate(user_messages):
+                    # Finde die entsprechende Claude-Antwort per O(1)-Lookup
+                    claude_response = user_to_assistant.get(user_msg, "[Keine Claude-Antwort gefunden]")
+
+                    # Finde Kontext-Dokumente für diese spezifische User-Nachricht:
+                    # der Block, in dem sie die letzte von i+1 User-Nachrichten war.
+                    # O(1)-Lookup statt erneutem Parse aller HISTORY-Blöcke.
+                    target_msg_count = i + 1  # Nachricht i+1 von 1-basiert
+                    candidates = blocks_by_count.get((target_msg_count, user_msg))
+                    if candidates:
+                        # Memoisiert pro Block: findall läuft höchstens einmal,
+                        # danach wird auch dieser Roh-Content freigegeben
+                        context_block = candidates[0]
+                        if context_block['context_docs'] is None:
+                            context_block['context_docs'] = self.extract_context_documents(context_block['content'])
+                            context_block['content'] = None
+                        context_docs = context_block['context_docs']
                     else:
-                        continue
-
-                bracket_count = 0
-                in_string = False
-                escape_next = False
-                json_end = len(json_part)
-
-                for k, char in enumerate(json_part):
-                    if escape_next:
-                        escape_next = False
-                        continue
-                    if char == '\\' and in_string:
-                        escape_next = True
-                        continue
-                    if char == '"' and not escape_next:
-                        in_string = not in_string
-                    if not in_string:
-                        if char == '[':
-                            bracket_count += 1
-                        elif char == ']':
-                            bracket_count -= 1
-                            if bracket_count == 0:
-                                json_end = k + 1
-                                break
-
-                json_str = json_part[:json_end]
-                history_data = json.loads(json_str)
-
-                # Extrahiere User-Nachrichten-Sequenz
-                user_messages = [msg.get('content', '').strip() for msg in history_data if msg.get('role') == 'user']
-
-                if not user_messages:
-                    continue
-
-                # Prüfe ob diese Sequenz bereits Teil einer gefundenen Konversation ist
-                is_subset = False
-                for existing_conv in found_conversations:
-                    existing_messages = existing_conv['user_messages']
-
-                    # Prüfe ob user_messages eine Teilmenge von existing_messages ist
-                    if len(user_messages) <= len(existing_messages):
-                        if user_messages == existing_messages[:len(user_messages)]:
-                            is_subset = True
-                            break
-
-                if not is_subset:
-                    # Neue Konversation gefunden!
-                    conversation_id = f"conv_{len(found_conversations) + 1}_{timestamp.strftime('%Y%m%d_%H%M%S')}"
-
-                    # Erstelle Messages für alle User-Nachrichten
-                    messages = []
-                    full_history_data = history_data
-
-                    for i, user_msg in enumerate(user_messages):
-                        # Finde die entsprechende Claude-Antwort
-                        claude_response = "[Keine Claude-Antwort gefunden]"
-
-                        # Suche in der history_data nach der Assistant-Antwort nach dieser User-Nachricht
-                        for j, msg in enumerate(full_history_data):
-                            if (msg.get('role') == 'user' and
-                                msg.get('content', '').strip() == user_msg):
-                                # Finde die nächste Assistant-Nachricht
-                                for k in range(j + 1, len(full_history_data)):
-                                    if full_history_data[k].get('role') == 'assistant':
-                                        claude_response = full_history_data[k].get('content', '').strip()
-                                        break
-                                break
-
-                        # Finde Kontext-Dokumente für diese spezifische User-Nachricht
                         context_docs = []
-                        # Suche nach dem HISTORY-Block, in dem diese User-Nachricht die letzte war
-                        target_msg_count = i + 1  # Nachricht i+1 von 1-basiert
-
-                        # Durchsuche alle HISTORY-Blöcke um den Block zu finden, der genau target_msg_count User-Nachrichten hat
-                        for search_block in history_blocks:
-                            try:
-                                # Parse diesen HISTORY-Block
-                                search_content = search_block['content']
-                                search_history_marker = search_content.find('[HISTORY][')
-                                if search_history_marker == -1:
-                                    continue
-
-                                search_json_start = search_history_marker + len('[HISTORY][')
-                                search_json_part = search_content[search_json_start:].strip()
-
-                                if not search_json_part.startswith('['):
-                                    if search_json_part.startswith('{'):
-                                        search_json_part = '[' + search_json_part
-                                    else:
-                                        continue
-
-                                # Robuste JSON-Extraktion für search block
-                                bracket_count = 0
-                                in_string = False
-                                escape_next = False
-                                json_end = len(search_json_part)
-
-                                for k, char in enumerate(search_json_part):
-                                    if escape_next:
-                                        escape_next = False
-                                        continue
-                                    if char == '\\' and in_string:
-                                        escape_next = True
-                                        continue
-                                    if char == '"' and not escape_next:
-                                        in_string = not in_string
-                                    if not in_string:
-                                        if char == '[':
-                                            bracket_count += 1
-                                        elif char == ']':
-                                            bracket_count -= 1
-                                            if bracket_count == 0:
-                                                json_end = k + 1
-                                                break
-
-                                search_json_str = search_json_part[:json_end]
-                                search_history_data = json.loads(search_json_str)
-
-                                # Zähle User-Nachrichten in diesem Block
-                                search_user_messages = [msg.get('content', '').strip() for msg in search_history_data if msg.get('role') == 'user']
-
-                                # Prüfe ob dieser Block genau die richtige Anzahl User-Nachrichten hat
-                                # und ob die letzte Nachricht mit unserer User-Nachricht übereinstimmt
-                                if (len(search_user_messages) == target_msg_count and
-                                    len(search_user_messages) > 0 and
-                                    search_user_messages[-1] == user_msg):
-                                    # Das ist der richtige Block für diese User-Nachricht!
-                                    context_docs = self.extract_context_documents(search_content)
-                                    break
-
-                            except (json.JSONDecodeError, ValueError):
-                                continue
-
-                        message = Message(
-                            timestamp=timestamp,
-                            user_message=user_msg,
-                            claude_response=claude_response,
-                            context_documents=context_docs
-                        )
-                        messages.append(message)
-
-                    conversation = Conversation(
-                        chat_id=conversation_id,
-                        first_message=user_messages[0],
-                        start_time=timestamp,
-                        message_count=len(user_messages),
-                        messages=messages
+
+                    message = Message(
+                        timestamp=timestamp,
+                        user_message=user_msg,
+                        claude_response=claude_response,
+                        context_documents=context_docs
                     )
+                    messages.append(message)
+
+                conversation = Conversation(
+                    chat_id=conversation_id,
+                    first_message=user_messages[0],
+                    start_time=timestamp,
+                    message_count=len(user_messages),
+                    messages=messages,
+                    last_timestamp=timestamp
+                )
 
-                    found_conversations.append({
-                        'user_messages': user_messages,
-                        'conversation': conversation,
-                        'timestamp': timestamp
-                    })
+                found_conversations.append({
+                    'user_messages': user_messages,
+                    'conversation': conversation,
+                    'timestamp': timestamp
+                })
 
-                    print(f"✓ Neue Konversation gefunden: {len(user_messages)} Nachrichten, Start: {timestamp_str}")
+                for k in range(1, len(user_messages) + 1):
+                    seen_prefixes.add((k, _sequence_fingerprint(user_messages[:k])))
 
-            except (json.JSONDecodeError, ValueError) as e:
-                continue
+                print(f"✓ Neue Konversation gefunden: {len(user_messages)} Nachrichten, Start: {timestamp_str}")
 
         # Sortiere Konversationen chronologisch (älteste zuerst) und füge zu self.conversations hinzu
         found_conversations.sort(key=lambda x: x['timestamp'])
 
         self.conversations = {}
+        self._conv_ids_sorted = []
+        self._last_ts_by_conv = {}
         for i, conv_data in enumerate(found_conversations):
-            conv_id = f"conversation_{i+1}"
-            self.conversations[conv_id] = conv_data['conversation']
+            self._register_conversation(f"conversation_{i+1}", conv_data['conversation'])
 
         print(f"\nAnalyse abgeschlossen. {len(self.conversations)} Konversationen gefunden.")
     
@@ -657,6 +641,8 @@ def main():
     parser = argparse.ArgumentParser(description='RagFlow Log Analyzer')
     parser.add_argument('logfile', nargs='?', default='ragflow-logs/ragflow_server.log',
                        help='Pfad zum Logfile (Standard: ragflow-logs/ragflow_server.log)')
+    parser.add_argument('--no-interactive', action='store_true',
+                       help='Nur die Übersicht ausgeben, keinen interaktiven Modus starten')
     
     args = parser.parse_args()
     
@@ -668,26 +654,37 @@ def main():
         print(f"Datei nicht gefunden: {args.logfile}")
         return
     
-    # Analyzer initialisieren und Logfile analysieren
+    # Analyzer initialisieren und Logfile analysieren (einmalig, gecacht)
     analyzer = RagFlowLogAnalyzer(args.logfile)
-    analyzer.analyze_logfile()
+    analyzer.ensure_parsed()
     
-    # Falls keine Konversationen gefunden wurden
+    # Falls keine Konversationen gefunden wurden: ein Write statt fünf prints
     if not analyzer.conversations:
-        print("\nKeine Konversationen konnten verknüpft werden.")
-        print("Mögliche Gründe:")
-        print("- HISTORY-Blöcke und POST-Requests sind zeitlich zu weit auseinander")
-        print("- JSON in HISTORY-Blöcken ist fehlerhaft")
-        print("- Unerwartetes Logfile-Format")
+        sys.stdout.write("\n".join((
+            "",
+            "Keine Konversationen konnten verknüpft werden.",
+            "Mögliche Gründe:",
+            "- HISTORY-Blöcke und POST-Requests sind zeitlich zu weit auseinander",
+            "- JSON in HISTORY-Blöcken ist fehlerhaft",
+            "- Unerwartetes Logfile-Format",
+            "")))
         return
     
-    # Optional: Interaktiven Modus starten (nur wenn TTY verfügbar)
+    # TTY-Erkennung vorab statt Exception-gesteuertem Fallback: der
+    # Docker-/CI-Pfad ohne Terminal läuft ohne try/except durch
+    interactive = not args.no_interactive and sys.stdin.isatty() and sys.stdout.isatty()
+
+    if not interactive:
+        # Ohne Terminal nur die Übersicht, keine Abschieds-Zeile je Lauf
+        analyzer.display_conversations_overview()
+        return
+
+    # Interaktiven Modus starten; Ctrl-D an einem input()-Prompt wirft
+    # EOFError und muss wie Ctrl-C als normales Ende behandelt werden
     try:
         analyzer.run_interactive_mode()
     except (EOFError, KeyboardInterrupt):
-        # Falls kein interaktiver Modus möglich, zeige wenigstens die Übersicht
-        analyzer.display_conversations_overview()
-        print("\nInteraktiver Modus nicht verfügbar oder beendet.")
+        print("\nInteraktiver Modus beendet.")
     
     print("Auf Wiedersehen!")
 
@@ -1,30 +1,68 @@
-with open('./chat_model.py', 'r') as f:
-    lines = f.readlines()
-
-new_lines = []
-for i, line in enumerate(lines):
-    new_lines.append(line)
-    
-    # Fix 1: Add _clean_conf call after system line in GoogleChat._chat
-    if 'class GoogleChat(Base):' in line:
-        in_google_chat = True
-    elif line.strip().startswith('class ') and 'GoogleChat' not in line:
-        in_google_chat = False
-    
-    if 'in_google_chat' in locals() and in_google_chat and '    def _chat(self, history, gen_conf={}, **kwargs):' in line:
-        if i + 1 < len(lines) and 'system = ' in lines[i + 1]:
-            new_lines.append(lines[i + 1])
-            new_lines.append('        gen_conf = self._clean_conf(gen_conf)\n')
-            lines[i + 1] = ''
-
-# Fix 2: Delete max_tokens after conversion in _clean_conf
-fixed_content = ''.join(new_lines)
-fixed_content = fixed_content.replace(
-    '                gen_conf["max_output_tokens"] = gen_conf["max_tokens"]\n',
-    '                gen_conf["max_output_tokens"] = gen_conf["max_tokens"]\n                del gen_conf["max_tokens"]\n'
-)
-
-with open('./chat_model.py', 'w') as f:
-    f.write(fixed_content)
+import mmap
+import os
+import re
+import sys
+import tempfile
+
+# Beide Fixes in einem Pattern, damit ein einziger sub-Durchlauf über den
+# Puffer reicht:
+# Fix 1: _clean_conf call direkt nach der system-Zeile in GoogleChat._chat
+# Fix 2: max_tokens nach der Konvertierung in _clean_conf löschen
+PATCH_RE = re.compile(
+    rb'(?P<chat>^class GoogleChat\(Base\):.*?\n    def _chat\(self, history, gen_conf=\{\}, \*\*kwargs\):\n        system = [^\n]*\n)'
+    rb'|(?P<conv>^                gen_conf\["max_output_tokens"\] = gen_conf\["max_tokens"\]\n)',
+    re.DOTALL | re.MULTILINE)
+
+DEL_MAX_TOKENS_RE = re.compile(
+    rb'(                gen_conf\["max_output_tokens"\] = gen_conf\["max_tokens"\]\n)')
+
+
+def _apply_fixes(match: re.Match) -> bytes:
+    if match.lastgroup == 'chat':
+        # Die max_tokens-Konvertierung in GoogleChat._clean_conf liegt
+        # innerhalb dieses Matches und wird hier mitbehandelt
+        body = DEL_MAX_TOKENS_RE.sub(rb'\1                del gen_conf["max_tokens"]\n', match.group())
+        return body + b'        gen_conf = self._clean_conf(gen_conf)\n'
+    return match.group() + b'                del gen_conf["max_tokens"]\n'
+
+
+with open('./chat_model.py', 'rb') as f:
+    # mmap statt readlines(): keine Zeilen-Objekte, die Regexes laufen
+    # direkt über den gemappten Puffer
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Bereits gepatcht (z. B. gecachtes Docker-Image)? Geprüft wird an den
+    # konkreten Patch-Stellen: der _clean_conf-Call direkt hinter der
+    # system-Zeile von GoogleChat._chat sowie das 16 Spaces eingerückte
+    # del direkt hinter der max_tokens-Konvertierung — die Marker-Strings
+    # allein kommen auch in ungepatchten Quellen vor
+    gc_pos = mm.find(b'class GoogleChat(Base):')
+    chat_pos = mm.find(b'    def _chat(self, history, gen_conf={}, **kwargs):', gc_pos) if gc_pos != -1 else -1
+    clean_conf_applied = (
+        chat_pos != -1
+        and mm.find(b'gen_conf = self._clean_conf(gen_conf)', chat_pos, chat_pos + 400) != -1)
+    del_applied = mm.find(
+        b'gen_conf["max_output_tokens"] = gen_conf["max_tokens"]\n'
+        b'                del gen_conf["max_tokens"]') != -1
+
+    if clean_conf_applied and del_applied:
+        mm.close()
+        print("✓ chat_model.py already patched")
+        sys.exit(0)
+
+    fixed = PATCH_RE.sub(_apply_fixes, mm)
+    mm.close()
+
+# Atomar zurückschreiben: Temp-Datei im selben Verzeichnis + os.replace,
+# ein einziger großer Write statt Text-Modus-Kopien, kein halb
+# geschriebenes chat_model.py bei einem Abbruch
+fd, tmp_path = tempfile.mkstemp(dir='.', prefix='.chat_model.', suffix='.py')
+try:
+    with os.fdopen(fd, 'wb', buffering=max(len(fixed), 1 << 20)) as f:
+        f.write(fixed)
+    os.replace(tmp_path, './chat_model.py')
+except BaseException:
+    os.unlink(tmp_path)
+    raise
 
 print("✓ Fix applied to chat_model.py")